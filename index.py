@@ -1,22 +1,207 @@
 import os
-import csv
-import requests
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
-from concurrent.futures import ThreadPoolExecutor
-from functools import partial
-import time
+import sys
+import asyncio
+import httpx
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Any, Mapping, Optional
+import logging
 import argparse
 from dotenv import load_dotenv
 
-def make_request(base_url: str, headers: Dict[str, str], endpoint: str,
-                params: Optional[Dict[str, Any]] = None, timeout: int = 30) -> List[Dict[str, Any]]:
+logger = logging.getLogger(__name__)
+
+# Canvas API requests allowed in flight per --threads. Canvas charges every open request
+# against one shared rate-limit budget, so the cap covers all courses and students together
+REQUESTS_PER_THREAD = 2
+
+# Columns of the per-course activity files consumed by process_into_page_views_by_day.py
+ACTIVITY_SCHEMA = pa.schema([
+    ('student_id', pa.int64()),
+    ('student_name', pa.string()),
+    ('date', pa.string()),
+    ('page_views', pa.int32()),
+])
+
+# Start throttling once Canvas's remaining rate-limit budget drops below this
+RATE_LIMIT_THRESHOLD = 100
+
+# Transient server errors that are retried with exponential backoff
+RETRY_STATUSES = {500, 502, 503, 504}
+MAX_RETRIES = 5
+RETRY_BACKOFF = 0.3
+
+# Throttled requests are retried until Canvas's budget refills, waiting at most this long between tries
+MAX_THROTTLE_BACKOFF = 60.0
+
+class CanvasClient(httpx.AsyncClient):
+    """
+    HTTP/2 client shared by every Canvas API call, with one cap on requests in flight
+    and one rate-limit pause that holds back all new requests.
+    """
+
+    def __init__(self, max_in_flight: int, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.request_slots = asyncio.Semaphore(max_in_flight)
+        # Event-loop time before which no new request may start
+        self.resume_at = 0.0
+
+    def pause_requests(self, delay: float) -> None:
+        """Hold back every new request on this client for at least delay seconds."""
+        if delay > 0:
+            self.resume_at = max(self.resume_at, asyncio.get_running_loop().time() + delay)
+
+    async def wait_for_budget(self) -> None:
+        """Wait until any pause set by pause_requests has passed."""
+        loop = asyncio.get_running_loop()
+        # Another response may extend the pause while we sleep, so re-check afterwards
+        while (wait := self.resume_at - loop.time()) > 0:
+            await asyncio.sleep(wait)
+
+def create_client(headers: Dict[str, str], max_in_flight: int) -> CanvasClient:
+    """
+    Create the HTTP/2 client shared by every Canvas API call.
+
+    Args:
+        headers: Request headers including authorization
+        max_in_flight: Maximum number of Canvas API requests open at once
+
+    Returns:
+        Async client that multiplexes requests over pooled keep-alive connections
+    """
+    limits = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+    transport = httpx.AsyncHTTPTransport(http2=True, limits=limits, retries=MAX_RETRIES)
+    return CanvasClient(max_in_flight, headers=headers, transport=transport)
+
+def rate_limit_delay(response_headers: Mapping[str, str]) -> float:
+    """
+    Work out how long to pause based on Canvas's rate-limit headers.
+
+    Args:
+        response_headers: Headers from the most recent API response
+
+    Returns:
+        Seconds to sleep before the next request (0 when budget is plentiful)
+    """
+    try:
+        remaining = float(response_headers.get('X-Rate-Limit-Remaining', '700'))
+    except ValueError:
+        return 0.0
+    if remaining >= RATE_LIMIT_THRESHOLD:
+        return 0.0
+    return max(0.0, (RATE_LIMIT_THRESHOLD - remaining) * 0.01)
+
+def retry_after_delay(response_headers: Mapping[str, str]) -> float:
+    """
+    Read the server-requested wait from a Retry-After header.
+
+    Args:
+        response_headers: Headers from the throttled or failed response
+
+    Returns:
+        Seconds to wait (0 when the header is missing or unparseable)
+    """
+    value = response_headers.get('Retry-After')
+    if not value:
+        return 0.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    # Retry-After may also be an HTTP date
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return 0.0
+
+def is_rate_limited(response: httpx.Response) -> bool:
+    """
+    Check whether Canvas rejected a request for exceeding its rate limit.
+
+    Args:
+        response: Response to inspect
+
+    Returns:
+        True for Canvas's 403 Forbidden (Rate Limit Exceeded) response
+    """
+    return response.status_code == 403 and 'Rate Limit Exceeded' in response.text
+
+def next_page_url(link_header: str) -> Optional[str]:
+    """
+    Extract the rel="next" URL from a Canvas Link header.
+
+    Args:
+        link_header: Raw Link header value
+
+    Returns:
+        The next page URL, or None on the last page or if the header is malformed
+    """
+    for part in link_header.split(','):
+        if 'rel="next"' in part:
+            start = part.find('<')
+            end = part.find('>', start + 1)
+            if start == -1 or end == -1:
+                logger.warning("Malformed Link header, stopping pagination: %s", link_header)
+                return None
+            return part[start + 1:end]
+    return None
+
+async def get_with_retries(client: CanvasClient, url: str,
+                           params: Dict[str, Any], timeout: int) -> httpx.Response:
+    """
+    Issue a GET request, pacing it against Canvas's rate-limit budget and retrying
+    throttled or transient errors with exponential backoff.
+
+    Args:
+        client: Shared Canvas API client
+        url: Request URL
+        params: Query parameters
+        timeout: Request timeout in seconds
+
+    Returns:
+        The successful response
+    """
+    failures = 0
+    throttled = 0
+    while True:
+        # httpx replaces a URL's query string with any params passed, even empty ones,
+        # so omit them entirely when following pagination links
+        async with client.request_slots:
+            await client.wait_for_budget()
+            response = await client.get(url, params=params or None, timeout=timeout)
+
+        # The budget is shared by every request, so a low reading pauses all of them
+        client.pause_requests(rate_limit_delay(response.headers))
+
+        if response.status_code == 429 or is_rate_limited(response):
+            # Throttling clears once the budget refills, so cap the wait rather than the attempts
+            wait = max(retry_after_delay(response.headers),
+                       min(RETRY_BACKOFF * (2 ** throttled), MAX_THROTTLE_BACKOFF))
+            throttled += 1
+            logger.debug("Rate limited on %s, pausing requests for %.1fs (attempt %d)", url, wait, throttled)
+            client.pause_requests(wait)
+            continue
+
+        if response.status_code not in RETRY_STATUSES or failures == MAX_RETRIES:
+            break
+
+        logger.debug("Retrying %s after HTTP %d (attempt %d)", url, response.status_code, failures + 1)
+        await asyncio.sleep(max(retry_after_delay(response.headers), RETRY_BACKOFF * (2 ** failures)))
+        failures += 1
+    response.raise_for_status()
+    return response
+
+async def make_request(client: CanvasClient, base_url: str, endpoint: str,
+                       params: Optional[Dict[str, Any]] = None, timeout: int = 30) -> List[Dict[str, Any]]:
     """
     Make a GET request to the Canvas API with automatic pagination.
 
     Args:
+        client: Shared Canvas API client carrying the authorization headers
         base_url: Canvas API base URL
-        headers: Request headers including authorization
         endpoint: API endpoint
         params: Query parameters
         timeout: Request timeout in seconds
@@ -35,42 +220,41 @@ def make_request(base_url: str, headers: Dict[str, str], endpoint: str,
         try:
             page_count += 1
             # For logging, show the base URL and some key parameters if present
-            log_url = url.split('?')[0]
-            param_log = []
-            if 'start_time' in current_params:
-                param_log.append(f"start_time={current_params['start_time']}")
-            if 'end_time' in current_params:
-                param_log.append(f"end_time={current_params['end_time']}")
-            if 'search_term' in current_params:
-                param_log.append(f"search_term={current_params['search_term']}")
-            if param_log:
-                print(f"Requesting page {page_count}: {log_url} with {', '.join(param_log)}")
-            else:
-                print(f"Requesting page {page_count}: {log_url}")
-
-            response = requests.get(url, headers=headers, params=current_params, timeout=timeout)
-            response.raise_for_status()
+            if logger.isEnabledFor(logging.DEBUG):
+                log_url = url.split('?')[0]
+                param_log = []
+                if 'start_time' in current_params:
+                    param_log.append(f"start_time={current_params['start_time']}")
+                if 'end_time' in current_params:
+                    param_log.append(f"end_time={current_params['end_time']}")
+                if 'search_term' in current_params:
+                    param_log.append(f"search_term={current_params['search_term']}")
+                if param_log:
+                    logger.debug("Requesting page %d: %s with %s", page_count, log_url, ', '.join(param_log))
+                else:
+                    logger.debug("Requesting page %d: %s", page_count, log_url)
+
+            response = await get_with_retries(client, url, current_params, timeout)
 
             # Check if response is empty
-            content = response.text
+            content = response.content
             if not content.strip():
-                print(f"Warning: Empty response received from {url}")
+                logger.warning("Empty response received from %s", url)
                 break
 
             # Try to parse the JSON
             try:
-                data = response.json()
+                data = orjson.loads(content)
                 items = data if isinstance(data, list) else [data]
                 all_items.extend(items)
-                print(f"Received {len(items)} items from page {page_count}")
-            except ValueError as e:
-                print(f"Error parsing JSON from {url}: {str(e)}")
-                print(f"Response content (first 200 chars): {content[:200]}")
+                logger.debug("Received %d items from page %d", len(items), page_count)
+            except orjson.JSONDecodeError as e:
+                logger.error("Error parsing JSON from %s: %s", url, e)
+                logger.error("Response content (first 200 chars): %s", content[:200].decode('utf-8', errors='replace'))
                 raise
 
             # Check for pagination
-            links = response.links if hasattr(response, 'links') else {}
-            next_link = links.get('next', {}).get('url')
+            next_link = next_page_url(response.headers.get('Link', ''))
 
             # If we have a next page, set the URL but clear params since they're included in the URL
             if next_link:
@@ -79,27 +263,24 @@ def make_request(base_url: str, headers: Dict[str, str], endpoint: str,
             else:
                 break
 
-        except requests.exceptions.Timeout:
-            print(f"Request timed out for {url}")
-            print("Continuing to next request...")
+        except httpx.TimeoutException:
+            logger.warning("Request timed out for %s", url)
+            logger.warning("Continuing to next request...")
             break
-        except requests.exceptions.RequestException as e:
-            print(f"Request error for {url}: {str(e)}")
+        except httpx.HTTPError as e:
+            logger.error("Request error for %s: %s", url, e)
             raise
 
-        # Rate limiting to avoid API throttling
-        time.sleep(0.2)
-
     return all_items
 
-def get_courses_by_search(base_url: str, headers: Dict[str, str],
-                         subaccount_id: str, search_term: str = None) -> List[Dict[str, Any]]:
+async def get_courses_by_search(client: CanvasClient, base_url: str,
+                               subaccount_id: str, search_term: str = None) -> List[Dict[str, Any]]:
     """
     Get courses by searching in a specific subaccount.
 
     Args:
+        client: Shared Canvas API client
         base_url: Canvas API base URL
-        headers: Request headers
         subaccount_id: Canvas subaccount ID (use 'self' for the root account)
         search_term: Optional search term to filter courses
 
@@ -116,21 +297,21 @@ def get_courses_by_search(base_url: str, headers: Dict[str, str],
         params["search_term"] = search_term
 
     endpoint = f"accounts/{subaccount_id}/courses"
-    return make_request(base_url, headers, endpoint, params)
+    return await make_request(client, base_url, endpoint, params)
 
-def get_course(base_url: str, headers: Dict[str, str], course_id: int) -> Dict[str, Any]:
+async def get_course(client: CanvasClient, base_url: str, course_id: int) -> Dict[str, Any]:
     """
     Get course details.
 
     Args:
+        client: Shared Canvas API client
         base_url: Canvas API base URL
-        headers: Request headers
         course_id: Canvas course ID
 
     Returns:
         Course details dictionary
     """
-    result = make_request(base_url, headers, f"courses/{course_id}")
+    result = await make_request(client, base_url, f"courses/{course_id}")
 
     # Handle different response types
     if not result:
@@ -149,33 +330,33 @@ def get_course(base_url: str, headers: Dict[str, str], course_id: int) -> Dict[s
     # If we got something else (like a string), raise an error
     raise TypeError(f"Unexpected response type for course {course_id}: {type(result)}, value: {str(result)[:100]}")
 
-def get_course_students(base_url: str, headers: Dict[str, str], course_id: int) -> List[Dict[str, Any]]:
+async def get_course_students(client: CanvasClient, base_url: str, course_id: int) -> List[Dict[str, Any]]:
     """
     Get all students in a course.
 
     Args:
+        client: Shared Canvas API client
         base_url: Canvas API base URL
-        headers: Request headers
         course_id: Canvas course ID
 
     Returns:
         List of student details
     """
-    return make_request(
+    return await make_request(
+        client,
         base_url,
-        headers,
         f"courses/{course_id}/users",
         {"enrollment_type[]": "student", "per_page": 100}
     )
 
-def get_student_activity(base_url: str, headers: Dict[str, str],
-                       course_id: int, student_id: int, timeout: int = 60) -> Dict[str, Any]:
+async def fetch_student_activity(client: CanvasClient, base_url: str,
+                                 course_id: int, student_id: int, timeout: int = 60) -> Dict[str, Any]:
     """
     Get activity analytics for a student in a course.
 
     Args:
+        client: Shared Canvas API client
         base_url: Canvas API base URL
-        headers: Request headers
         course_id: Canvas course ID
         student_id: Canvas user ID
         timeout: Request timeout in seconds
@@ -183,9 +364,9 @@ def get_student_activity(base_url: str, headers: Dict[str, str],
     Returns:
         Dictionary containing activity data
     """
-    result = make_request(
+    result = await make_request(
+        client,
         base_url,
-        headers,
         f"courses/{course_id}/analytics/users/{student_id}/activity",
         timeout=timeout
     )
@@ -195,95 +376,134 @@ def get_student_activity(base_url: str, headers: Dict[str, str],
         return result[0]
     return result
 
-def process_course(course_id: int, base_url: str, headers: Dict[str, str], output_dir: str) -> None:
+async def fetch_all_student_activity(client: CanvasClient, base_url: str, course_id: int,
+                                     students: List[Dict[str, Any]]) -> List[Any]:
+    """
+    Fetch activity analytics for every student in a course concurrently.
+
+    Args:
+        client: Shared Canvas API client
+        base_url: Canvas API base URL
+        course_id: Canvas course ID
+        students: List of student details
+
+    Returns:
+        Activity data (or the raised exception) for each student, in input order
+    """
+    # The client's shared request cap bounds how many of these actually run at once
+    return await asyncio.gather(
+        *(fetch_student_activity(client, base_url, course_id, student['id']) for student in students),
+        return_exceptions=True
+    )
+
+def write_activity_parquet(output_path: str, columns: Dict[str, List[Any]]) -> None:
+    """
+    Write a course's page view rows to a zstd-compressed Parquet file.
+
+    Args:
+        output_path: Destination Parquet file
+        columns: Column name to values mapping matching ACTIVITY_SCHEMA
+    """
+    table = pa.Table.from_pydict(columns, schema=ACTIVITY_SCHEMA)
+    pq.write_table(table, output_path, compression='zstd')
+
+async def process_course(client: CanvasClient, course_id: int, base_url: str, output_dir: str,
+                         course: Optional[Dict[str, Any]] = None) -> bool:
     """
     Process a single course to extract activity analytics for all students.
 
     Args:
+        client: Shared Canvas API client
         course_id: Canvas course ID
         base_url: Canvas API base URL
-        headers: Request headers
         output_dir: Directory to save output files
+        course: Course details already returned by a search; fetched when omitted
+
+    Returns:
+        True if activity was recorded for every student, False if the course failed
+        or any student's analytics could not be fetched
     """
     try:
-        print(f"Starting to process course {course_id}...")
+        logger.info("Starting to process course %s...", course_id)
 
         # Verify API connection first
         try:
-            # Get course details
-            course = get_course(base_url, headers, course_id)
+            # Get course details unless the course search already returned them
+            if course is None:
+                course = await get_course(client, base_url, course_id)
             if not isinstance(course, dict):
-                print(f"Error: Expected course data to be a dictionary, but got {type(course)}")
-                print(f"Value: {str(course)[:100]}")
-                return
+                logger.error("Expected course data to be a dictionary, but got %s", type(course))
+                logger.error("Value: %s", str(course)[:100])
+                return False
         except Exception as e:
-            print(f"Failed to get course {course_id} details: {str(e)}")
-            print("This could be due to an invalid API key, incorrect base URL, or the course doesn't exist.")
-            print("Ensure your .env file has a valid CANVAS_API_KEY and verify the course ID.")
-            return
+            logger.error("Failed to get course %s details: %s", course_id, e)
+            logger.error("This could be due to an invalid API key, incorrect base URL, or the course doesn't exist.")
+            logger.error("Ensure your .env file has a valid CANVAS_API_KEY and verify the course ID.")
+            return False
 
         course_name = course.get("name", f"unknown-{course_id}")
 
         # Clean course name for filename
         safe_name = "".join(c if c.isalnum() else "_" for c in course_name)
-        filename = f"{course_id}_{safe_name}_activity.csv"
+        filename = f"{course_id}_{safe_name}_activity.parquet"
         output_path = os.path.join(output_dir, filename)
 
         # Get all students in the course
-        print(f"Fetching students for course {course_id} ({course_name})...")
-        students = get_course_students(base_url, headers, course_id)
-        print(f"Processing {len(students)} students for course {course_id} ({course_name})")
-
-        # Initialize CSV file with headers
-        with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = [
-                'student_id', 'student_name', 'date', 'page_views'
-            ]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-
-            # Process each student
-            for i, student in enumerate(students):
-                student_id = student['id']
-                student_name = f"{student.get('name', 'Unknown')}"
-
-                print(f"Processing student {i+1}/{len(students)}: {student_name} (ID: {student_id})")
-
-                try:
-                    # Get activity analytics for this student
-                    activity_data = get_student_activity(base_url, headers, course_id, student_id)
-
-                    # Check if we have view data
-                    if not activity_data or not isinstance(activity_data, dict):
-                        print(f"No activity data for student {student_name} (ID: {student_id})")
-                        continue
-
-                    page_views = activity_data.get('page_views', {})
-
-                    if not page_views:
-                        print(f"No page view data for student {student_name} (ID: {student_id})")
-                        continue
-
-                    # Write page views by date to CSV
-                    for date, views in page_views.items():
-                        writer.writerow({
-                            'student_id': student_id,
-                            'student_name': student_name,
-                            'date': date,
-                            'page_views': views
-                        })
-
-                    print(f"Recorded {len(page_views)} hours of activity for student {student_name}")
-
-                except Exception as e:
-                    print(f"Error processing student {student_name} (ID: {student_id}): {str(e)}")
-                    print("Continuing to next student...")
-                    continue
-
-        print(f"Completed course {course_id} ({course_name}). Output saved to {output_path}")
+        logger.info("Fetching students for course %s (%s)...", course_id, course_name)
+        students = await get_course_students(client, base_url, course_id)
+        logger.info("Processing %d students for course %s (%s)", len(students), course_id, course_name)
+
+        # Fetch activity analytics for all students concurrently
+        activities = await fetch_all_student_activity(client, base_url, course_id, students)
+
+        columns = {name: [] for name in ACTIVITY_SCHEMA.names}
+        failed_student_ids = []
+        for i, (student, activity_data) in enumerate(zip(students, activities)):
+            student_id = student['id']
+            student_name = f"{student.get('name', 'Unknown')}"
+
+            logger.debug("Processing student %d/%d: %s (ID: %s)", i + 1, len(students), student_name, student_id)
+
+            if isinstance(activity_data, Exception):
+                logger.warning("Error processing student %s (ID: %s): %s", student_name, student_id, activity_data)
+                logger.warning("Continuing to next student...")
+                failed_student_ids.append(student_id)
+                continue
+
+            # Check if we have view data
+            if not activity_data or not isinstance(activity_data, dict):
+                logger.debug("No activity data for student %s (ID: %s)", student_name, student_id)
+                continue
+
+            page_views = activity_data.get('page_views', {})
+
+            if not page_views:
+                logger.debug("No page view data for student %s (ID: %s)", student_name, student_id)
+                continue
+
+            # Collect page views by date column-wise
+            columns['student_id'].extend([student_id] * len(page_views))
+            columns['student_name'].extend([student_name] * len(page_views))
+            columns['date'].extend(page_views.keys())
+            columns['page_views'].extend(page_views.values())
+
+            logger.debug("Recorded %d hours of activity for student %s", len(page_views), student_name)
+
+        # Write the whole course to Parquet in one pass, off the event loop
+        await asyncio.to_thread(write_activity_parquet, output_path, columns)
+
+        if failed_student_ids:
+            logger.error("Course %s (%s) is INCOMPLETE: activity missing for %d of %d students (IDs: %s). "
+                         "Partial output saved to %s", course_id, course_name, len(failed_student_ids),
+                         len(students), ", ".join(str(sid) for sid in failed_student_ids), output_path)
+            return False
+
+        logger.info("Completed course %s (%s). Output saved to %s", course_id, course_name, output_path)
+        return True
 
     except Exception as e:
-        print(f"Error processing course {course_id}: {str(e)}")
+        logger.error("Error processing course %s: %s", course_id, e)
+        return False
 
 def main():
     # Parse command line arguments
@@ -294,7 +514,8 @@ def main():
     parser.add_argument('--output-dir', default='output',
                         help='Directory to save output files (default: output)')
     parser.add_argument('--threads', type=int, default=3,
-                        help='Number of concurrent threads (default: 3)')
+                        help='Number of courses processed concurrently; also caps Canvas API '
+                             'requests in flight at twice this (default: 3)')
     parser.add_argument('--course-ids', nargs='+', type=int,
                         help='Specific course IDs to process (overrides search)')
     args = parser.parse_args()
@@ -302,6 +523,21 @@ def main():
     # Load environment variables from .env file
     load_dotenv()
 
+    # Per-page and per-student detail is logged at DEBUG; set LOG_LEVEL=DEBUG to see it
+    log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
+    # getLevelName maps known names to their numeric level and anything else to a string
+    valid_level = isinstance(logging.getLevelName(log_level), int)
+    logging.basicConfig(level=log_level if valid_level else 'INFO',
+                        format='%(asctime)s %(levelname)s %(message)s')
+    if not valid_level:
+        logger.warning("Unknown LOG_LEVEL %r, falling back to INFO", log_level)
+        log_level = 'INFO'
+
+    # httpx logs every request at INFO, so only let it through when debugging
+    if log_level != 'DEBUG':
+        logging.getLogger('httpx').setLevel(logging.WARNING)
+        logging.getLogger('httpcore').setLevel(logging.WARNING)
+
     # Get API key from environment variable
     api_key = os.getenv('CANVAS_API_KEY')
     if not api_key:
@@ -311,58 +547,78 @@ def main():
     if not base_url:
         raise ValueError("CANVAS_BASE_URL environment variable not set. Please create a .env file with this variable.")
 
-    output_dir = args.output_dir
-    num_threads = args.threads
-
     # Create output directory if it doesn't exist
-    os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(args.output_dir, exist_ok=True)
 
     # Set up API authentication
     headers = {"Authorization": f"Bearer {api_key}"}
 
-    # Get course IDs - either from command line or by searching
-    course_ids = []
-
-    if args.course_ids:
-        course_ids = args.course_ids
-        print(f"Using {len(course_ids)} course IDs provided via command line")
-    else:
-        print(f"Searching for courses in subaccount {args.subaccount}" +
-              (f" with search term '{args.search}'" if args.search else ""))
-
-        # Search for courses
-        courses = get_courses_by_search(base_url, headers, args.subaccount, args.search)
-
-        if not courses:
-            print("No courses found matching the search criteria.")
-            return
-
-        # Print course details and collect IDs
-        print(f"Found {len(courses)} courses:")
-        for i, course in enumerate(courses):
-            course_id = course.get('id')
-            course_name = course.get('name', 'Unknown')
-            term_name = course.get('term', {}).get('name', 'Unknown term')
-            print(f"{i+1}. [{course_id}] {course_name} ({term_name})")
-            course_ids.append(course_id)
-
-    if not course_ids:
-        print("No course IDs to process. Exiting.")
-        return
-
-    print(f"Processing {len(course_ids)} courses...")
-
-    # Process courses in parallel
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        process_course_partial = partial(
-            process_course,
-            base_url=base_url,
-            headers=headers,
-            output_dir=output_dir
-        )
-        executor.map(process_course_partial, course_ids)
-
-    print("All courses processed!")
+    incomplete_course_ids = asyncio.run(run(args, base_url, headers))
+    if incomplete_course_ids:
+        logger.error("%d courses failed or are incomplete: %s", len(incomplete_course_ids),
+                     ", ".join(str(course_id) for course_id in incomplete_course_ids))
+        sys.exit(1)
+
+async def run(args: argparse.Namespace, base_url: str, headers: Dict[str, str]) -> List[int]:
+    """
+    Collect the courses to process and process them concurrently over one shared client.
+
+    Args:
+        args: Parsed command line arguments
+        base_url: Canvas API base URL
+        headers: Request headers
+
+    Returns:
+        IDs of courses that failed or are missing some students' activity
+    """
+    async with create_client(headers, args.threads * REQUESTS_PER_THREAD) as client:
+        # Get course IDs - either from command line or by searching
+        course_ids = []
+        # Course details from the search, reused so each course isn't fetched again
+        searched_courses = {}
+
+        if args.course_ids:
+            course_ids = args.course_ids
+            logger.info("Using %d course IDs provided via command line", len(course_ids))
+        else:
+            logger.info("Searching for courses in subaccount %s%s", args.subaccount,
+                        f" with search term '{args.search}'" if args.search else "")
+
+            # Search for courses
+            courses = await get_courses_by_search(client, base_url, args.subaccount, args.search)
+
+            if not courses:
+                logger.info("No courses found matching the search criteria.")
+                return []
+
+            # Print course details and collect IDs
+            logger.info("Found %d courses:", len(courses))
+            for i, course in enumerate(courses):
+                course_id = course.get('id')
+                course_name = course.get('name', 'Unknown')
+                term_name = course.get('term', {}).get('name', 'Unknown term')
+                logger.info("%d. [%s] %s (%s)", i + 1, course_id, course_name, term_name)
+                course_ids.append(course_id)
+                searched_courses[course_id] = course
+
+        if not course_ids:
+            logger.info("No course IDs to process. Exiting.")
+            return []
+
+        logger.info("Processing %d courses...", len(course_ids))
+
+        # Process courses concurrently, at most args.threads at a time
+        semaphore = asyncio.Semaphore(args.threads)
+
+        async def bounded(course_id: int) -> bool:
+            async with semaphore:
+                return await process_course(client, course_id, base_url, args.output_dir,
+                                            course=searched_courses.get(course_id))
+
+        completed = await asyncio.gather(*(bounded(course_id) for course_id in course_ids))
+
+    logger.info("All courses processed!")
+    return [course_id for course_id, complete in zip(course_ids, completed) if not complete]
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,66 +1,116 @@
 import os
+import numpy as np
 import pandas as pd
-from datetime import datetime
-import pytz
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from numba import njit, prange, set_num_threads
+from zoneinfo import ZoneInfo
 from pathlib import Path
-from functools import partial
-from typing import List, Dict, Any
-
-def convert_to_vancouver_time(timestamp: str) -> datetime:
-    """Convert UTC timestamp to Vancouver local time."""
-    # Parse the ISO format timestamp
-    dt = pd.to_datetime(timestamp)
-
-    # If timezone not specified in string, assume UTC
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=pytz.UTC)
-
-    # Convert to Vancouver time zone
-    vancouver_tz = pytz.timezone('America/Vancouver')
-    return dt.astimezone(vancouver_tz)
-
-def process_csv(file_path: str, output_dir: str) -> None:
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Tuple
+
+# Local time zone used to bucket page views into days
+VANCOUVER_TZ = ZoneInfo('America/Vancouver')
+
+# Rows read per batch; memory scales with this plus the number of (student, day) groups
+BATCH_SIZE = 500_000
+
+# Schema of the per-day output CSVs
+OUTPUT_SCHEMA = pa.schema([
+    ('student_id', pa.int64()),
+    ('student_name', pa.string()),
+    ('day', pa.date32()),
+    ('page_views', pa.int64()),
+])
+
+def local_days(dates: pa.Array) -> np.ndarray:
+    """Convert UTC timestamp strings to Vancouver local days since the epoch (int32)."""
+    # Hourly timestamps repeat across students, so parse each distinct value only once
+    encoded = dates.dictionary_encode()
+    unique_dates = encoded.dictionary.to_numpy(zero_copy_only=False)
+    local_time = pd.to_datetime(unique_dates, utc=True, format='ISO8601').tz_convert(VANCOUVER_TZ)
+    unique_days = local_time.tz_localize(None).to_numpy().astype('datetime64[D]').astype('int32')
+    return unique_days[encoded.indices.to_numpy()]
+
+@njit(parallel=True, cache=True)
+def group_sum(views: np.ndarray, bounds: np.ndarray, out: np.ndarray) -> None:
+    """Sum views[bounds[i]:bounds[i + 1]] into out[i] for each contiguous group."""
+    for i in prange(len(bounds) - 1):
+        total = 0
+        for j in range(bounds[i], bounds[i + 1]):
+            total += views[j]
+        out[i] = total
+
+def sum_groups(student_ids: np.ndarray, days: np.ndarray, views: np.ndarray,
+               names: pa.Array) -> Tuple[np.ndarray, np.ndarray, np.ndarray, pa.Array]:
+    """Collapse rows sharing a (student_id, day) pair into one row per pair, ordered by pair."""
+    # Sort by student_id, then day, so every group is one contiguous run
+    order = np.lexsort((days, student_ids))
+    sorted_ids = student_ids[order]
+    sorted_days = days[order]
+    changes = (np.diff(sorted_ids) != 0) | (np.diff(sorted_days) != 0)
+    bounds = np.concatenate(([0], np.flatnonzero(changes) + 1, [len(order)]))
+    starts = bounds[:-1]
+
+    # Sum views over each run with the compiled, multi-threaded kernel
+    totals = np.empty(len(starts), dtype=np.int64)
+    group_sum(views[order], bounds, totals)
+
+    # student_name depends only on student_id, so take it from each group's first row
+    return sorted_ids[starts], sorted_days[starts], totals, names.take(order[starts])
+
+def process_file(file_path: str, output_dir: str) -> None:
     """
-    Process a single CSV file:
-    1. Convert timestamps to Vancouver time
-    2. Group by student_id, student_name, day and sum page_views
+    Process a single activity Parquet file into a per-day CSV:
+    1. Convert timestamps to Vancouver local dates
+    2. Group by student_id, day and sum page_views
     3. Handle empty files gracefully
     """
-    # Read the CSV
-    df = pd.read_csv(file_path)
-
-    # Check if the dataframe is empty
-    if df.empty:
-        print(f"Warning: {os.path.basename(file_path)} is empty. Creating empty output file.")
-        # Create output filename
-        input_filename = os.path.basename(file_path)
-        output_filename = f"processed_{input_filename}"
-        output_path = os.path.join(output_dir, output_filename)
+    # Create output filename
+    input_filename = os.path.basename(file_path)
+    output_filename = f"processed_{Path(input_filename).stem}.csv"
+    output_path = os.path.join(output_dir, output_filename)
 
+    # Fold the file in batch by batch; sums are associative, so only the running
+    # per-(student, day) totals are kept in memory
+    student_ids = np.empty(0, dtype=np.int64)
+    days = np.empty(0, dtype=np.int32)
+    totals = np.empty(0, dtype=np.int64)
+    names = pa.array([], type=pa.string())
+    columns = ['student_id', 'student_name', 'date', 'page_views']
+    for batch in pq.ParquetFile(file_path).iter_batches(batch_size=BATCH_SIZE, columns=columns):
+        student_ids, days, totals, names = sum_groups(
+            np.concatenate((student_ids, batch.column('student_id').to_numpy().astype(np.int64))),
+            np.concatenate((days, local_days(batch.column('date')))),
+            np.concatenate((totals, batch.column('page_views').to_numpy().astype(np.int64))),
+            pa.concat_arrays([names, batch.column('student_name')])
+        )
+
+    # Check if the file had no rows
+    if len(student_ids) == 0:
+        print(f"Warning: {input_filename} is empty. Creating empty output file.")
         # Create an empty file with the expected headers
-        pd.DataFrame(columns=['student_id', 'student_name', 'day', 'page_views']).to_csv(output_path, index=False)
+        pacsv.write_csv(OUTPUT_SCHEMA.empty_table(), output_path)
         return
 
-    # Convert date column to Vancouver time
-    df['vancouver_time'] = df['date'].apply(convert_to_vancouver_time)
+    result = pa.table({
+        'student_id': student_ids,
+        'student_name': names,
+        'day': pa.array(days).cast(pa.date32()),
+        'page_views': totals,
+    }, schema=OUTPUT_SCHEMA)
 
-    # Extract date part only (no time)
-    df['day'] = df['vancouver_time'].dt.date
-
-    # Group by student_id, student_name, and day, then sum page_views
-    result = df.groupby(['student_id', 'student_name', 'day'], as_index=False)['page_views'].sum()
-
-    # Create output filename
-    input_filename = os.path.basename(file_path)
-    output_filename = f"processed_{input_filename}"
-    output_path = os.path.join(output_dir, output_filename)
-
-    # Save the result
-    result.to_csv(output_path, index=False)
+    # Save the result with PyArrow's C++ CSV writer
+    pacsv.write_csv(result, output_path)
     print(f"Processed {input_filename} -> {output_filename}")
 
+def init_worker() -> None:
+    """Run group_sum single-threaded in pool workers; the pool already spreads files across cores."""
+    set_num_threads(1)
+
 def process_directory(input_dir: str, output_dir: str) -> None:
-    """Process all CSV files in the given directory."""
+    """Process all activity Parquet files in the given directory."""
     # Make output_dir a relative path if it's an absolute path
     if output_dir.startswith('/'):
         # Convert to a subdirectory of current working directory
@@ -71,28 +121,32 @@ def process_directory(input_dir: str, output_dir: str) -> None:
     # Create output directory if it doesn't exist
     Path(output_dir).mkdir(parents=True, exist_ok=True)
 
-    # Get all CSV files
-    csv_files = [f for f in os.listdir(input_dir) if f.lower().endswith('.csv')]
+    # Get all activity files
+    input_files = [f for f in os.listdir(input_dir) if f.lower().endswith('.parquet')]
 
-    if not csv_files:
-        print(f"No CSV files found in {input_dir}")
+    if not input_files:
+        print(f"No Parquet files found in {input_dir}")
         return
 
-    # Process each CSV file
-    for csv_file in csv_files:
-        file_path = os.path.join(input_dir, csv_file)
-        try:
-            process_csv(file_path, output_dir)
-        except Exception as e:
-            print(f"Error processing {csv_file}: {str(e)}")
+    # Process files in parallel, one worker process per CPU core
+    with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=init_worker) as executor:
+        futures = {
+            executor.submit(process_file, os.path.join(input_dir, input_file), output_dir): input_file
+            for input_file in input_files
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error processing {futures[future]}: {str(e)}")
 
-    print(f"All {len(csv_files)} CSV files processed successfully.")
+    print(f"All {len(input_files)} Parquet files processed successfully.")
 
 if __name__ == "__main__":
     import argparse
 
-    parser = argparse.ArgumentParser(description="Process CSV files with student data")
-    parser.add_argument("input_dir", help="Directory containing CSV files to process")
+    parser = argparse.ArgumentParser(description="Process activity Parquet files with student data")
+    parser.add_argument("input_dir", help="Directory containing activity Parquet files to process")
     parser.add_argument("--output_dir", default="processed_output",
                         help="Directory for output CSV files (default: processed_output)")
 